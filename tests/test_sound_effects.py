@@ -0,0 +1,84 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("moviepy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+import video_generator as vg
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "soundEffects")
+
+
+def peak_db(path):
+    """max_volume of the audio track as reported by ffmpeg's volumedetect"""
+    cmd = [vg.get_setting("FFMPEG_BINARY"), "-hide_banner", "-i", path,
+           "-map", "0:a", "-af", "volumedetect", "-f", "null", "-"]
+    err = subprocess.run(cmd, capture_output=True, text=True).stderr
+    return float(re.search(r"max_volume: (\S+) dB", err).group(1))
+
+
+@pytest.fixture
+def scenes(tmp_path, monkeypatch):
+    monkeypatch.setattr(vg, "SFX_DIR", ASSETS)
+    img = tmp_path / "scene.jpg"
+    Image.fromarray(np.full((90, 160, 3), 128, "uint8")).save(img)
+    return [{"path": str(img), "duration": 2, "motion": "none", "transition": None}]
+
+
+@pytest.mark.parametrize("render", [vg.render_with_ffmpeg, vg.render_with_moviepy])
+def test_fade_out_without_duration_keeps_audio(tmp_path, scenes, render):
+    effects = vg.resolve_sound_effects([{"name": "Pop", "start": 0.5, "fade_out": 0.2}])
+    out = str(tmp_path / "out.mp4")
+    render(scenes, effects, (160, 90), out)
+    assert peak_db(out) > -30
+
+
+def test_fade_out_placed_at_real_end_when_duration_exceeds_file():
+    sfx = {"name": "Pop", "path": "Pop.mp3", "length": 0.5, "start": 0, "volume": 1.0,
+           "duration": 3.0, "fade_in": 0, "fade_out": 0.2}
+    chain = vg.sfx_filters([sfx], 1, 10)[0]
+    assert "atrim" not in chain
+    assert "afade=t=out:st=0.3:d=0.2" in chain
+
+
+def test_undecodable_effect_is_skipped(tmp_path, scenes, monkeypatch):
+    sfx_dir = tmp_path / "sfx"
+    sfx_dir.mkdir()
+    (sfx_dir / "Bad.mp3").write_bytes(b"\x00not audio" * 100)
+    (sfx_dir / "Pop.mp3").write_bytes(open(os.path.join(ASSETS, "Pop.mp3"), "rb").read())
+    monkeypatch.setattr(vg, "SFX_DIR", str(sfx_dir))
+
+    effects = vg.resolve_sound_effects([{"name": "Bad"}, {"name": "Pop", "start": 0.5}])
+    assert [sfx["name"] for sfx in effects] == ["Pop"]
+
+    out = str(tmp_path / "out.mp4")
+    vg.render_with_ffmpeg(scenes, effects, (160, 90), out)
+    assert peak_db(out) > -30
+
+
+def test_failed_mix_keeps_rendered_video(tmp_path, scenes):
+    bad = tmp_path / "Bad.mp3"
+    bad.write_bytes(b"\x00not audio" * 100)
+    effects = [{"name": "Bad", "path": str(bad), "length": 1.0, "start": 0, "volume": 1.0,
+                "duration": None, "fade_in": 0, "fade_out": 0}]
+
+    out = str(tmp_path / "out.mp4")
+    vg.render_with_ffmpeg(scenes, effects, (160, 90), out)  # must not raise
+    assert os.path.getsize(out) > 0
+
+
+@pytest.mark.parametrize("fade", [None, "0.2", "0:00.2", "soon"])
+def test_fade_values_are_parsed_like_times(tmp_path, scenes, fade):
+    effects = vg.resolve_sound_effects([{"name": "Pop", "start": 0.5, "fade_in": fade, "fade_out": fade}])
+    assert all(isinstance(effects[0][key], (int, float)) for key in ("fade_in", "fade_out"))
+
+    out = str(tmp_path / "out.mp4")
+    vg.render_with_ffmpeg(scenes, effects, (160, 90), out)
+    assert peak_db(out) > -30
@@ -1,15 +1,42 @@
 import json
 import os
+import sys
+import logging
+import hashlib
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
 from PIL import Image
-from moviepy.editor import ImageClip, concatenate_videoclips, AudioFileClip, CompositeAudioClip
-import traceback
+from moviepy.editor import ImageClip, concatenate_videoclips
+from moviepy.config import get_setting
+
+log = logging.getLogger("video_generator")
 
 # API Configuration
 API_KEY = os.getenv("API_KEY", "01828567716") # Fallback key
 API_URL = "https://simple-ai-image-genaretor.deptoroy91.workers.dev/"
+IMAGE_MODEL = "@cf/black-forest-labs/flux-1-schnell"
+CACHE_DIR = "cache"
 DIMENSIONS = {"16:9": (1920, 1080), "9:16": (1080, 1920)}
+FPS = 24
+
+# One pooled session for all scenes so parallel requests reuse TCP/TLS connections.
+# Only 502/503/504 gateway responses are retried, with backoff. POST has to be allowed
+# for that, but each retry starts a new generation on the worker, so timeouts and
+# connection errors are NOT retried: a stalled worker costs one timeout, not four.
+MAX_PARALLEL_REQUESTS = 16
+RETRY = Retry(total=3, connect=0, read=0, other=0, status=3, backoff_factor=0.5,
+              status_forcelist=[502, 503, 504], allowed_methods=frozenset({"POST"}),
+              raise_on_status=False)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=MAX_PARALLEL_REQUESTS, pool_maxsize=MAX_PARALLEL_REQUESTS,
+                                      max_retries=RETRY))
 
 # --- Helper: Time Parser ---
 def parse_time(val):
@@ -26,59 +53,369 @@ def parse_time(val):
 
 # --- Helper: Generate Image ---
 def generate_image(prompt, ratio, index):
-    print(f"Generating Scene {index}...")
+    log.info(f"Generating Scene {index}...")
     headers = {"Content-Type": "application/json", "x-api-key": str(API_KEY).strip()}
-    payload = {"prompt": prompt, "size": ratio, "model": "@cf/black-forest-labs/flux-1-schnell"}
+    payload = {"prompt": prompt, "size": ratio, "model": IMAGE_MODEL}
+    filename = f"scene_{index}.jpg"
     
     try:
-        # Check if image already exists (caching for local testing)
-        filename = f"scene_{index}.jpg"
-        if os.path.exists(filename):
-            print(f"Skipping download, {filename} exists.")
+        # Cache keyed on the request content, so reordered scenes or other
+        # inputs reuse an image only when it was generated from the same request
+        key = hashlib.blake2b(f"{prompt}|{ratio}|{IMAGE_MODEL}".encode(), digest_size=16).hexdigest()
+        cached = os.path.join(CACHE_DIR, f"{key}.jpg")
+        if os.path.exists(cached):
+            log.info(f"Skipping download, Scene {index} is cached.")
+            shutil.copyfile(cached, filename)
             return filename
 
-        response = requests.post(API_URL, json=payload, headers=headers, timeout=120)
+        response = SESSION.post(API_URL, json=payload, headers=headers, timeout=120)
         if response.status_code == 200:
-            with open(filename, "wb") as f:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Write + rename so a parallel scene never reads a half-written file
+            tmp = f"{cached}.{index}.tmp"
+            with open(tmp, "wb") as f:
                 f.write(response.content)
+            os.replace(tmp, cached)
+            shutil.copyfile(cached, filename)
             return filename
         else:
-            print(f"API Error {response.status_code}: {response.text}")
+            log.error(f"API Error {response.status_code} on Scene {index}: {response.text}")
             return None
     except Exception as e:
-        print(f"Request Error: {e}")
+        log.error(f"Request Error on Scene {index}: {e}")
         return None
 
 # --- Helper: Motion Effect ---
+MAX_ZOOM = 1.15
+
 def apply_motion(clip, motion, size):
     w, h = size
+    zoom = motion in ("zoom-in", "zoom-out")
+    pan = motion in ("pan-left", "pan-right", "pan-up", "pan-down")
+
+    # "none" (or missing/unknown) motion: plain still, no per-frame work at all
+    if not zoom and not pan:
+        if tuple(clip.size) == (w, h): return clip
+        # Still needs the output size so every scene can be chained as-is
+        still = Image.fromarray(clip.get_frame(0)).resize((w, h), Image.Resampling.LANCZOS)
+        return ImageClip(np.asarray(still)).set_duration(clip.duration)
+
+    # Source is a still image: Lanczos upsample it ONCE to the largest scale the
+    # motion needs, then every frame only picks a window out of this base.
+    # Pans travel across an image held at MAX_ZOOM so there is room to move.
+    s_max = MAX_ZOOM
+    bw, bh = int(w * s_max), int(h * s_max)
+    base = Image.fromarray(clip.get_frame(0)).resize((bw, bh), Image.Resampling.LANCZOS)
+
+    # The motion is a fixed ramp over the clip, so the sampling box of every
+    # frame is computed up front and the frame callback just looks it up.
+    n = max(1, int(clip.duration * FPS) + 1)
+    p = np.linspace(0, 1, n)
+    scales = np.full(n, s_max)
+    if motion == "zoom-in": scales = 1.0 + (0.15 * p) # Smooth zoom
+    elif motion == "zoom-out": scales = 1.15 - (0.15 * p)
+    
+    nw, nh = w * scales, h * scales
+    
+    # Center crop logic
+    ox, oy = (nw - w) / 2, (nh - h) / 2
+    
+    if motion == "pan-right": ox = (nw - w) * p
+    elif motion == "pan-left": ox = (nw - w) * (1 - p)
+    elif motion == "pan-up": oy = (nh - h) * (1 - p)
+    elif motion == "pan-down": oy = (nh - h) * p
+    
+    if pan:
+        # Constant scale: every frame is a plain window of the base, no resampling
+        base_arr = np.asarray(base)
+        # Whole, even pixel offsets: no subpixel jitter and the window stays on
+        # the yuv420p chroma grid (ffmpeg's crop does the same on its path)
+        offsets = np.clip(np.rint(np.stack([ox, oy], axis=1)), 0, [bw - w, bh - h]).astype(int)
+        offsets = (offsets & ~1).tolist()
+
+        def effect(get_frame, t):
+            x, y = offsets[min(n - 1, int(round(t * FPS)))]
+            return base_arr[y:y + h, x:x + w]
+
+        return clip.fl(effect)
+
+    # Map each (w, h) window at scale s back onto the base (scale s_max)
+    k = s_max / scales
+    boxes = np.stack([ox * k, oy * k, (ox + w) * k, (oy + h) * k], axis=1)
+    boxes = np.clip(boxes, 0, [bw, bh, bw, bh]).tolist() # float rounding at the ramp ends
+
     def effect(get_frame, t):
-        img = Image.fromarray(get_frame(t))
-        p = t / clip.duration
-        s = 1.0
-        if motion == "zoom-in": s = 1.0 + (0.15 * p) # Smooth zoom
-        elif motion == "zoom-out": s = 1.15 - (0.15 * p)
-        
-        nw, nh = int(w * s), int(h * s)
-        img = img.resize((nw, nh), Image.Resampling.LANCZOS)
-        
-        # Center crop logic
-        ox, oy = (nw - w) / 2, (nh - h) / 2
+        # Crop + scale in a single resampling pass, straight to (w, h)
+        box = boxes[min(n - 1, int(round(t * FPS)))]
+        return np.asarray(base.resize((w, h), Image.Resampling.BILINEAR, box=box))
+    
+    return clip.fl(effect)
+
+# --- Helper: Encoder Selection ---
+# Hardware encoders in order of preference, each with a constant-quality target
+# roughly matching libx264 -crf 23 so output quality doesn't depend on the machine
+HW_CODECS = {
+    "h264_nvenc": ["-preset", "p4", "-rc", "vbr", "-cq", "23"],
+    "h264_videotoolbox": ["-q:v", "65"],
+    "h264_qsv": ["-global_quality", "23", "-pix_fmt", "nv12"], # QSV takes 4:2:0 as nv12, not yuv420p
+}
+
+@lru_cache(maxsize=None)
+def pick_codec():
+    """Returns the first usable H.264 hardware encoder, falling back to libx264"""
+    ffmpeg = get_setting("FFMPEG_BINARY")
+    try:
+        listed = subprocess.run([ffmpeg, "-hide_banner", "-encoders"],
+                                capture_output=True, text=True, timeout=30).stdout
+    except Exception:
+        return "libx264"
+
+    for codec, params in HW_CODECS.items():
+        if codec not in listed: continue
+        # Being compiled in doesn't mean the hardware exists (e.g. NVENC on a
+        # GPU-less CI runner), so encode a few test frames before trusting it;
+        # with the quality settings too, as not every device supports them
+        probe = [ffmpeg, "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                 "-i", "color=size=256x256:duration=0.2", "-c:v", codec] + params + ["-f", "null", "-"]
+        try:
+            if subprocess.run(probe, capture_output=True, timeout=30).returncode == 0:
+                return codec
+        except Exception:
+            pass
+    return "libx264"
+
+def encoder_threads(preset=None):
+    """Encoder thread count: every core for the fast x264 presets (frame threading
+    scales almost linearly there), capped at 8 for slower presets"""
+    cores = os.cpu_count() or 4
+    if preset in (None, "ultrafast", "superfast"):
+        return cores
+    return min(cores, 8)
+
+def encoder_settings():
+    """write_videofile() arguments for the selected encoder"""
+    codec = pick_codec()
+    # moov atom up front so playback can start before the whole file is fetched
+    params = ["-movflags", "+faststart", "-pix_fmt", "yuv420p"]
+    settings = {"codec": codec, "threads": encoder_threads(), "ffmpeg_params": params}
+    if codec == "libx264":
+        # superfast keeps CABAC/deblocking that ultrafast drops: about the same
+        # speed, far smaller files. CRF targets constant quality.
+        settings["preset"] = "superfast"
+        settings["threads"] = encoder_threads(settings["preset"])
+        params += ["-crf", "23", "-tune", "stillimage"] # every scene is an animated still
+    else:
+        params += HW_CODECS[codec]
+    return settings
+
+def ffmpeg_codec_args(threads=None):
+    """encoder_settings() as ffmpeg command line arguments, optionally with fewer threads"""
+    settings = encoder_settings()
+    args = ["-c:v", settings["codec"]]
+    if "preset" in settings:
+        args += ["-preset", settings["preset"]]
+    return args + settings["ffmpeg_params"] + ["-threads", str(threads or settings["threads"])]
+
+# --- Helper: Sound Effects ---
+SFX_DIR = "assets/soundEffects"
+
+def probe_audio(path):
+    """Decodes an audio file once with ffmpeg; returns its length in seconds, or None if it can't be decoded"""
+    cmd = [get_setting("FFMPEG_BINARY"), "-v", "error", "-nostdin", "-xerror", "-i", path,
+           "-map", "0:a:0", "-f", "null", "-progress", "pipe:1", "-"]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    times = [line.split("=", 1)[1] for line in result.stdout.splitlines() if line.startswith("out_time_us=")]
+    if result.returncode != 0 or not times or not times[-1].isdigit():
+        return None
+    return int(times[-1]) / 1e6
+
+def resolve_sound_effects(effects):
+    """Finds the asset file of every sound effect and normalizes its options"""
+    resolved = []
+    for sfx in effects:
+        name = sfx.get("name")
+
+        # Find file
+        f_path = None
+        for ext in [".mp3", ".wav", ".ogg"]:
+            p = os.path.join(SFX_DIR, name + ext)
+            if os.path.exists(p):
+                f_path = p
+                break
+
+        if not f_path:
+            log.warning(f"❌ SFX File not found: {name}")
+            continue
+
+        # Real length is needed to place the fade-out at the end of the sound
+        length = probe_audio(f_path)
+        if not length:
+            log.warning(f"⚠️ Error with SFX {name}: {f_path} could not be decoded, skipping")
+            continue
+
+        duration = sfx.get("duration") # Cut audio length (optional)
+        resolved.append({
+            "name": name,
+            "path": f_path,
+            "length": length,
+            "start": parse_time(sfx.get("start", 0)),
+            "volume": float(sfx.get("volume", 0.5)),
+            "duration": parse_time(duration) if duration else None,
+            "fade_in": parse_time(sfx.get("fade_in", 0)),
+            "fade_out": parse_time(sfx.get("fade_out", 0)),
+        })
+    return resolved
+
+def sfx_filters(effects, first_input, video_duration):
+    """ffmpeg filter chains that place each effect on the timeline and mix them into [aout],
+    cut at the end of the video"""
+    chains, labels = [], []
+    for i, sfx in enumerate(effects):
+        steps = []
+        end = sfx["length"]
+        # Trim only when it actually shortens the sound; the fade then sits at the real end
+        if sfx["duration"] and sfx["duration"] < end:
+            end = sfx["duration"]
+            steps.append(f"atrim=end={end}")
+        if sfx["fade_in"] > 0: steps.append(f"afade=t=in:d={sfx['fade_in']}")
+        if sfx["fade_out"] > 0:
+            steps.append(f"afade=t=out:st={max(0, end - sfx['fade_out'])}:d={sfx['fade_out']}")
+        delay_ms = int(round(sfx["start"] * 1000))
+        steps += [f"volume={sfx['volume']}", f"adelay={delay_ms}:all=1"]
+        chains.append(f"[{first_input + i}:a]" + ",".join(steps) + f"[sfx{i}]")
+        labels.append(f"[sfx{i}]")
+    chains.append("".join(labels) + f"amix=inputs={len(effects)}:normalize=0:duration=longest,"
+                  f"atrim=end={video_duration}[aout]")
+    return chains
+
+def mux_sound_effects(video, effects, duration, out):
+    """Mixes the effects with ffmpeg and attaches them to a silent video without re-encoding it.
+    The silent video is moved to `out` instead if the mix fails, so a finished render is never lost."""
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-hide_banner", "-loglevel", "error", "-i", video]
+    for sfx in effects:
+        cmd += ["-i", sfx["path"]]
+    cmd += ["-filter_complex", ";".join(sfx_filters(effects, 1, duration)),
+            "-map", "0:v", "-map", "[aout]", "-c:v", "copy", "-c:a", "aac",
+            "-movflags", "+faststart", out]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        os.remove(video)
+    except subprocess.CalledProcessError as e:
+        log.warning(f"⚠️ Error mixing sound effects, keeping silent video: {e.stderr}")
+        shutil.move(video, out)
+
+# --- Helper: Native ffmpeg Render ---
+def motion_filter(motion, dur, size):
+    """ffmpeg filter chain doing the apply_motion() effect on a looped still"""
+    w, h = size
+    frames = max(1, int(dur * FPS)) # same p = i / frames ramp as apply_motion()
+    bw, bh = int(w * MAX_ZOOM), int(h * MAX_ZOOM)
+
+    # perspective counts frames from 1, hence (in-1)
+    if motion == "zoom-in":
+        z = f"(1+0.15*(in-1)/{frames})"
+    elif motion == "zoom-out":
+        z = f"(1.15-0.15*(in-1)/{frames})"
+    else:
+        z = None
+    if z:
+        # zoompan only moves in whole pixels and visibly shakes; perspective samples
+        # the centered 1/z window of the MAX_ZOOM base with subpixel precision instead
+        lo, hi = f"(1-1/{z})/2", f"(1+1/{z})/2"
+        return (f"scale={bw}:{bh}:flags=lanczos,perspective=eval=frame:interpolation=linear"
+                f":x0='W*{lo}':y0='H*{lo}':x1='W*{hi}':y1='H*{lo}'"
+                f":x2='W*{lo}':y2='H*{hi}':x3='W*{hi}':y3='H*{hi}',scale={w}:{h}:flags=bilinear")
+
+    pans = {
+        "pan-right": (f"(iw-ow)*t/{dur}", "(ih-oh)/2"),
+        "pan-left": (f"(iw-ow)*(1-t/{dur})", "(ih-oh)/2"),
+        "pan-down": ("(iw-ow)/2", f"(ih-oh)*t/{dur}"),
+        "pan-up": ("(iw-ow)/2", f"(ih-oh)*(1-t/{dur})"),
+    }
+    if motion in pans:
+        x, y = pans[motion]
+        return f"scale={bw}:{bh}:flags=lanczos,crop={w}:{h}:x='{x}':y='{y}'"
+    return f"scale={w}:{h}:flags=lanczos"
+
+MAX_HW_SESSIONS = 3 # consumer GPUs cap concurrent hardware encode sessions
+
+def render_segment(scene, size, out, threads=None):
+    """Encodes one scene (looped still + motion) to its own short mp4"""
+    chain = motion_filter(scene["motion"], scene["duration"], size) + f",fps={FPS},setsar=1,format=yuv420p"
+    if scene["transition"] == "crossfade":
+        chain += ",fade=t=in:st=0:d=1"
+    dur = str(scene["duration"])
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-hide_banner", "-loglevel", "error",
+           "-loop", "1", "-framerate", str(FPS), "-t", dur, "-i", scene["path"],
+           "-vf", chain, "-t", dur, "-r", str(FPS)] + ffmpeg_codec_args(threads) + [out]
+    subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+def render_with_ffmpeg(scenes, effects, size, out):
+    """Renders every scene as an ffmpeg segment and joins them without re-encoding (no Python frame loop)"""
+    ffmpeg = get_setting("FFMPEG_BINARY")
+    with tempfile.TemporaryDirectory() as tmp:
+        segments = [os.path.join(tmp, f"seg_{k}.mp4") for k in range(len(scenes))]
+
+        # Each segment is its own ffmpeg process, so scenes encode side by side
+        # across the cores; threads here only wait on the subprocesses
+        cores = os.cpu_count() or 4
+        workers = min(len(scenes), cores if pick_codec() == "libx264" else MAX_HW_SESSIONS)
+        threads = max(1, cores // workers)
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(lambda job: render_segment(job[0], size, job[1], threads), zip(scenes, segments)))
+
+        # Segments share encoder settings, so the concat demuxer can stream-copy them
+        listing = os.path.join(tmp, "scenes.txt")
+        with open(listing, "w") as f:
+            f.writelines(f"file '{seg}'\n" for seg in segments)
+        video = os.path.join(tmp, "video_only.mp4") if effects else out
+        subprocess.run([ffmpeg, "-y", "-hide_banner", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                        "-i", listing, "-c", "copy", "-movflags", "+faststart", video],
+                       check=True, capture_output=True, text=True)
+
+        if effects:
+            # Audio is cut at the end of the video
+            mux_sound_effects(video, effects, sum(scene["duration"] for scene in scenes), out)
+
+# --- Fallback: moviepy Render ---
+def render_with_moviepy(scenes, effects, size, out):
+    video_clips = []
+    for scene in scenes:
+        c = ImageClip(scene["path"]).set_duration(scene["duration"])
+        c = apply_motion(c, scene["motion"], size)
         
-        if motion == "pan-right": ox = (nw - w) * p
-        elif motion == "pan-left": ox = (nw - w) * (1 - p)
-        elif motion == "pan-up": oy = (nh - h) * (1 - p)
-        elif motion == "pan-down": oy = (nh - h) * p
+        if scene["transition"] == "crossfade":
+            c = c.crossfadein(1.0)
         
-        return np.array(img.crop((ox, oy, ox + w, oy + h)).resize((w, h)))
-    
-    return clip.fl(effect) if motion != "none" else clip
+        video_clips.append(c)
 
-# --- MAIN BUILDER FUNCTION ---
-def build_video(input_data=None):
+    # Only crossfades need the per-frame compositor; every clip is already
+    # (W, H), so otherwise the scenes can simply be played back to back
+    needs_compose = any(scene["transition"] == "crossfade" for scene in scenes)
+    final_video = concatenate_videoclips(video_clips, method="compose" if needs_compose else "chain")
+    log.info(f"🎥 Video created. Duration: {final_video.duration}s")
+
+    # Video is written silent; the sound effects are mixed by ffmpeg afterwards
+    # instead of being decoded and summed frame by frame in Python
+    silent = out if not effects else "{}_silent{}".format(*os.path.splitext(out))
+    final_video.write_videofile(
+        silent, 
+        fps=FPS, 
+        audio=False,
+        **encoder_settings()
+    )
+    if effects:
+        mux_sound_effects(silent, effects, final_video.duration, out)
+
+# --- Pipeline Stages ---
+# Each stage returns (ok, result); a failed stage is fatal and stops the run
+# before any encoding time is spent on a video that can't be right.
+def load_input(input_data):
+    """Input as a dict: passed directly (object or JSON string) or from JSON_INPUT"""
     try:
-        # 1. Handle Input (Object vs JSON String)
-        data = {}
         if input_data:
             # If function is called with a Dictionary/Object directly
             data = input_data if isinstance(input_data, dict) else json.loads(input_data)
@@ -86,107 +423,103 @@ def build_video(input_data=None):
             # Fallback to Environment Variable (GitHub Actions)
             json_str = os.getenv("JSON_INPUT")
             if not json_str:
-                print("❌ Error: No input provided.")
-                return
+                log.error("❌ Error: No input provided.")
+                return False, None
             data = json.loads(json_str)
+    except json.JSONDecodeError as e:
+        log.error(f"❌ Invalid JSON input: {e}")
+        return False, None
+
+    scenes = data.get("scenes") if isinstance(data, dict) else None
+    if not scenes:
+        log.error("❌ Input has no scenes.")
+        return False, None
+    missing = [n + 1 for n, scene in enumerate(scenes) if not scene.get("bg_prompt")]
+    if missing:
+        log.error(f"❌ Scenes without bg_prompt: {missing}")
+        return False, None
+    return True, data
+
+def check_ffmpeg():
+    """Both render paths (and the audio mix) need a working ffmpeg"""
+    ffmpeg = get_setting("FFMPEG_BINARY")
+    try:
+        subprocess.run([ffmpeg, "-version"], check=True, capture_output=True, timeout=30)
+    except (OSError, subprocess.SubprocessError) as e:
+        log.error(f"❌ ffmpeg not usable ({ffmpeg}): {e}")
+        return False, None
+    return True, ffmpeg
+
+def generate_scenes(scenes, ratio):
+    """Scene images + timing; any scene that fails to generate is fatal"""
+    # Image requests are independent I/O, so they run in parallel.
+    # Scene numbers come from the position (1, 2, 3...), so we don't need scene_n input
+    img_paths = [None] * len(scenes)
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_REQUESTS, len(scenes))) as ex:
+        futures = {ex.submit(generate_image, scene["bg_prompt"], ratio, n + 1): n for n, scene in enumerate(scenes)}
+        for future in as_completed(futures):
+            n = futures[future]
+            img_paths[n] = future.result()
+            if not img_paths[n]:
+                # Queued requests are dropped; ones already running can't be
+                # interrupted, so leaving the pool still waits for them (each is
+                # bounded by the request timeout, which is not retried)
+                cancelled = sum(f.cancel() for f in futures)
+                log.error(f"❌ Scene {n + 1} could not be generated; cancelled {cancelled} queued "
+                          "request(s), waiting for the ones in flight before stopping.")
+                break
+    if not all(img_paths):
+        return False, None
+
+    rendered = [{
+        "path": img_path,
+        "duration": parse_time(scene.get("duration", 5)),
+        "motion": scene.get("motion", "none"),
+        "transition": scene.get("transition"),
+    } for scene, img_path in zip(scenes, img_paths)]
+    return True, rendered
+
+# --- MAIN BUILDER FUNCTION ---
+def build_video(input_data=None):
+    """Builds final_video.mp4; returns True on success"""
+    # Progress goes through logging; show it when the caller hasn't configured
+    # logging (no-op otherwise)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        # 1. Handle Input (Object vs JSON String) and check tooling up front
+        ok, data = load_input(input_data)
+        if not ok: return False
+        ok, _ = check_ffmpeg()
+        if not ok: return False
 
         # Settings
         ratio = data.get("global_settings", {}).get("ratio", "16:9")
         W, H = DIMENSIONS.get(ratio, (1920, 1080))
         
         # 2. Process Scenes (Visuals)
-        video_clips = []
-        scenes = data.get("scenes", [])
-        
-        # 'enumerate' gives us the index (0, 1, 2...), so we don't need scene_n input
-        for idx, scene in enumerate(scenes):
-            scene_num = idx + 1 # 1, 2, 3...
-            img_path = generate_image(scene["bg_prompt"], ratio, scene_num)
-            
-            if img_path:
-                dur = parse_time(scene.get("duration", 5))
-                c = ImageClip(img_path).set_duration(dur)
-                c = apply_motion(c, scene.get("motion", "none"), (W, H))
-                
-                if scene.get("transition") == "crossfade":
-                    c = c.crossfadein(1.0)
-                
-                video_clips.append(c)
-
-        if not video_clips:
-            print("❌ No scenes generated.")
-            return
-
-        final_video = concatenate_videoclips(video_clips, method="compose")
-        print(f"🎥 Video created. Duration: {final_video.duration}s")
-
-        # 3. Process Sound Effects (Advanced)
-        audio_clips = []
-        assets_dir = "assets/soundEffects"
-        
-        for sfx in data.get("soundEffects", []):
-            name = sfx.get("name")
-            start_t = parse_time(sfx.get("start", 0))
-            vol = float(sfx.get("volume", 0.5))
-            
-            # Optional Parameters
-            duration = sfx.get("duration") # Cut audio length
-            fade_in = sfx.get("fade_in", 0)
-            fade_out = sfx.get("fade_out", 0)
-
-            # Find file
-            f_path = None
-            for ext in [".mp3", ".wav", ".ogg"]:
-                p = os.path.join(assets_dir, name + ext)
-                if os.path.exists(p):
-                    f_path = p
-                    break
-            
-            if f_path:
-                try:
-                    ac = AudioFileClip(f_path).volumex(vol)
-                    
-                    # Apply Trimming (Custom Duration)
-                    if duration:
-                        dur_sec = parse_time(duration)
-                        if dur_sec < ac.duration:
-                            ac = ac.subclip(0, dur_sec)
-                    
-                    # Apply Fades
-                    if fade_in > 0: ac = ac.audio_fadein(fade_in)
-                    if fade_out > 0: ac = ac.audio_fadeout(fade_out)
-                    
-                    # Set Start Time
-                    ac = ac.set_start(start_t)
-                    audio_clips.append(ac)
-                    print(f"✅ Added SFX: {name} | Start: {start_t}s")
-                except Exception as e:
-                    print(f"⚠️ Error with SFX {name}: {e}")
-            else:
-                print(f"❌ SFX File not found: {name}")
-
-        # 4. Merge Audio & Export
-        if audio_clips:
-            comp_audio = CompositeAudioClip(audio_clips)
-            # Clip audio to match video duration prevents black frames/silence at end
-            if comp_audio.duration > final_video.duration:
-                comp_audio = comp_audio.set_duration(final_video.duration)
-            final_video = final_video.set_audio(comp_audio)
-
-        final_video.write_videofile(
-            "final_video.mp4", 
-            fps=24, 
-            codec="libx264", 
-            audio_codec="aac",
-            preset="ultrafast", 
-            threads=2
-        )
-        print("🎉 Render Complete: final_video.mp4")
+        ok, rendered = generate_scenes(data["scenes"], ratio)
+        if not ok: return False
 
-    except Exception as e:
-        print(traceback.format_exc())
+        # 3. Process Sound Effects (Advanced); a missing effect is only a warning
+        effects = resolve_sound_effects(data.get("soundEffects", []))
+        for sfx in effects:
+            log.info(f"✅ Added SFX: {sfx['name']} | Start: {sfx['start']}s")
+
+        # 4. Render & Export: native ffmpeg first, moviepy if that fails
+        try:
+            render_with_ffmpeg(rendered, effects, (W, H), "final_video.mp4")
+        except (OSError, subprocess.CalledProcessError) as e:
+            log.warning(f"⚠️ ffmpeg render failed, falling back to moviepy: {getattr(e, 'stderr', None) or e}")
+            render_with_moviepy(rendered, effects, (W, H), "final_video.mp4")
+        log.info("🎉 Render Complete: final_video.mp4")
+        return True
+
+    except Exception:
+        log.exception("❌ Render failed")
+        return False
 
 # --- ENTRY POINT ---
 if __name__ == "__main__":
     # GitHub Actions will use env var, but you can also pass a dict directly here for local testing
-    build_video()
+    # Non-zero exit marks the workflow step as failed
+    sys.exit(0 if build_video() else 1)